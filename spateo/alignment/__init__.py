@@ -2,7 +2,12 @@ from .deformation import grid_deformation
 from .methods import align_preprocess, calc_exp_dissimilarity
 from .morpho_alignment import morpho_align, morpho_align_ref
 from .paste_alignment import paste_align, paste_align_ref
-from .transform import BA_transform, BA_transform_and_assignment, paste_transform
+from .transform import (
+    BA_transform,
+    BA_transform_and_assignment,
+    BA_transform_batch,
+    paste_transform,
+)
 from .utils import (
     downsampling,
     get_labels_based_on_coords,
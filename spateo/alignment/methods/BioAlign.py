@@ -247,7 +247,7 @@ def BA_align(
     nn_init: bool = True,
     SVI_mode: bool = False,
     batch_size: int = 1000,
-) -> Tuple[Optional[Tuple[AnnData, AnnData]], np.ndarray, np.ndarray]:
+) -> Tuple[Optional[Tuple[AnnData, AnnData]], np.ndarray, np.ndarray, np.ndarray]:
     """_summary_
 
     Args:
@@ -275,7 +275,7 @@ def BA_align(
         device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
         inplace: Whether to copy adata or modify it inplace.
         verbose: If ``True``, print progress updates.
-        added_similarity: The similarity matrix of the added other modality with shape n x m.
+        added_similarity: The similarity matrix of the added other modality with shape n x m. Low-precision (bool/uint8) indicator matrices are accepted and cast to the working dtype once.
         added_scale: The scale of the added similarity matrix. Interval from 0 to 1.
         partial_alignment: Whether to use partial alignment. Note that setting to True does not affect the alignment of two very similar samples. If you are aligning two samples with very different morphology, e.g., across time, you can set to False.
     """
@@ -375,9 +375,13 @@ def BA_align(
     ctrl_pts = Unique_coordsA[idx, :]
     K = ctrl_pts.shape[0]
 
-    # construct the kernel
-    GammaSparse = con_K(ctrl_pts, ctrl_pts, beta)
-    U = con_K(coordsA, ctrl_pts, beta)
+    # construct the kernel; rigid-only mode never evaluates the non-rigid
+    # basis, so skip building the (K, K) and (NA, K) kernel matrices
+    if mode == "S":
+        GammaSparse, U = None, None
+    else:
+        GammaSparse = con_K(ctrl_pts, ctrl_pts, beta)
+        U = con_K(coordsA, ctrl_pts, beta)
 
     # initialize parameters
     if proliferation_prior is None:
@@ -664,7 +668,6 @@ def BA_align(
             else:
                 randGeneDistMat = GeneDistMat[:, randIdx]  # NA x batch_size
             SpatialDistMat = cal_dist(XAHat, randcoordsB)
-        empty_cache(device=device)
 
     # full data
     if SVI_mode:
@@ -738,4 +741,5 @@ def BA_align(
         None if inplace else (sampleA, sampleB),
         nx.to_numpy(P.T),
         nx.to_numpy(sigma2),
+        nx.to_numpy(optimal_RnA),
     )
@@ -669,11 +669,15 @@ def _dist(
     if metric.lower() == "euc" or metric.lower() == "euclidean":
         distMat = nx.sum(mat1**2, 1)[:, None] + nx.sum(mat2**2, 1)[None, :] - 2 * _dot(nx)(mat1, mat2.T)
     else:
+        # the elementwise log is the dominant transcendental here; evaluate it
+        # once per matrix instead of twice
+        log_mat1 = nx.log(mat1)
+        log_mat2 = nx.log(mat2)
         distMat = (
-            nx.sum(mat1 * nx.log(mat1), 1)[:, None]
-            + nx.sum(mat2 * nx.log(mat2), 1)[None, :]
-            - _dot(nx)(mat1, nx.log(mat2).T)
-            - _dot(nx)(mat2, nx.log(mat1).T).T
+            nx.sum(mat1 * log_mat1, 1)[:, None]
+            + nx.sum(mat2 * log_mat2, 1)[None, :]
+            - _dot(nx)(mat1, log_mat2.T)
+            - _dot(nx)(mat2, log_mat1.T).T
         ) / 2
     return distMat
 
@@ -3,14 +3,36 @@ try:
 except ImportError:
     from typing_extensions import Literal
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
 from typing import List, Optional, Tuple, Union
 
 import numpy as np
+import pandas as pd
 from anndata import AnnData
+from numba import njit, prange
 
 from .methods import BA_align, empty_cache
-from .transform import BA_transform, BA_transform_and_assignment
-from .utils import _iteration, downsampling
+from .methods.utils import filter_common_genes, intersect_lsts
+from .transform import BA_transform, BA_transform_and_assignment, BA_transform_batch
+from .utils import _compress_pi, _iteration, downsampling, interpolate_pi_from_ref
+
+
+@njit(cache=True, parallel=True)
+def _label_sim_matrix(codesB: np.ndarray, codesA: np.ndarray) -> np.ndarray:
+    """Pairwise label mismatch indicator in the (NB, NA) orientation expected by ``BA_align``.
+
+    The matrix is a {0, 1} indicator, so it is kept as uint8 (one byte per
+    entry instead of eight); ``BA_align`` casts it to the working dtype once
+    on device.
+    """
+    NB, NA = codesB.shape[0], codesA.shape[0]
+    sim = np.empty((NB, NA), dtype=np.uint8)
+    for i in prange(NB):
+        code = codesB[i]
+        for j in range(NA):
+            sim[i, j] = 1 if code != codesA[j] else 0
+    return sim
 
 
 def morpho_align(
@@ -25,7 +47,11 @@ def morpho_align(
     dissimilarity: str = "kl",
     max_iter: int = 100,
     label_key: Optional[str] = None,
-    dtype: str = "float64",
+    pi_sparse: bool = False,
+    pi_mmap_dir: Optional[str] = None,
+    empty_cache_each_iter: bool = False,
+    copy: bool = True,
+    dtype: str = "float32",
     device: str = "cpu",
     verbose: bool = True,
     **kwargs,
@@ -44,7 +70,11 @@ def morpho_align(
         mode: The method of alignment. Available ``mode`` are: ``'S'``, ``'N'`` and ``'SN'``.
         dissimilarity: Expression dissimilarity measure: ``'kl'`` or ``'euclidean'``.
         max_iter: Max number of iterations for morpho alignment.
-        dtype: The floating-point number type. Only ``float32`` and ``float64``.
+        pi_sparse: If ``True``, near-zero entries of each pi matrix are dropped and the matrix is stored as a sparse CSR matrix.
+        pi_mmap_dir: If not None, each pi matrix is saved to ``pi_mmap_dir`` and kept as a read-only memory map instead of residing in memory.
+        empty_cache_each_iter: If ``True``, release the GPU memory cache after each pair alignment. Only useful on memory-constrained devices, as it forces a device synchronize per pair.
+        copy: Whether to copy ``models`` before alignment. If ``False``, the alignment results (``key_added``, ``'Rigid_align_spatial'``, etc.) are written directly into the caller's AnnData objects, saving one full copy per model.
+        dtype: The floating-point number type. Only ``float32`` and ``float64``. The ``float32`` default halves the memory bandwidth of the pairwise kernels; pass ``float64`` if full double precision is required.
         device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
         verbose: If ``True``, print progress updates.
         **kwargs: Additional parameters that will be passed to ``BA_align`` function.
@@ -54,42 +84,71 @@ def morpho_align(
         pis: List of pi matrices.
         sigma2s: List of sigma2.
     """
-    for m in models:
-        m.obsm[key_added] = m.obsm[spatial_key]
-    for m in models:
-        m.obsm["Rigid_3d_align_spatial"] = m.obsm[spatial_key]
-    for m in models:
-        m.obsm["Coarse_alignment"] = m.obsm[spatial_key]
-    for m in models:
-        m.obsm["optimal_RnA"] = m.obsm[spatial_key]
+    # normalize the genes argument once so downstream set operations do not
+    # re-hash a Python list per pair
+    genes = np.asarray(genes) if genes is not None else None
+
+    # BA_align only consumes the expression of the common genes, so slice each
+    # model to the common gene set before copying instead of deep-copying the
+    # full AnnData (X, all layers and var annotations) for every model
+    all_samples_genes = [m[0].var.index for m in models]
+    common_genes = filter_common_genes(*all_samples_genes, verbose=verbose)
+    common_genes = common_genes if genes is None else intersect_lsts(common_genes, genes)
+    common_genes = np.asarray(common_genes)
 
     pis, sigma2s = [], []
-    align_models = [model.copy() for model in models]
+    if copy:
+        # the per-model copies are independent and mostly GIL-releasing memcpy,
+        # so run them across a thread pool
+        with ThreadPoolExecutor(max_workers=min(8, len(models))) as executor:
+            align_models = list(executor.map(lambda m: m[:, common_genes].copy(), models))
+    else:
+        # operate directly on the caller's models; BA_align slices to the
+        # common genes internally
+        align_models = list(models)
+    # initialize all alignment keys with the raw spatial coordinate in one pass,
+    # sharing a single array reference per model
+    for m in align_models:
+        raw_spatial = m.obsm[spatial_key]
+        m.obsm[key_added] = raw_spatial
+        m.obsm["Rigid_3d_align_spatial"] = raw_spatial
+        m.obsm["Coarse_alignment"] = raw_spatial
+        m.obsm["optimal_RnA"] = raw_spatial
+
+    # the label categories are typically shared across the whole series, so
+    # compute the union and the per-model codes once instead of re-encoding
+    # each model every time it appears in a pair
+    label_codes = [None] * len(align_models)
+    if label_key is not None:
+        labeled = [i for i, m in enumerate(align_models) if label_key in m.obs]
+        if len(labeled) > 0:
+            UnionCategories = reduce(np.union1d, [align_models[i].obs[label_key].cat.categories for i in labeled])
+            # a single shared category can never produce a mismatch, so only
+            # encode when the labels can carry information
+            if len(UnionCategories) > 1:
+                cat_dtype = pd.CategoricalDtype(categories=UnionCategories)
+                for i in labeled:
+                    cat = align_models[i].obs[label_key]
+                    codes = pd.Categorical(cat, dtype=cat_dtype).codes.astype(np.int32)
+                    codes[np.asarray(cat) == "unknown"] = -1
+                    label_codes[i] = codes
+
     progress_name = f"Models alignment based on morpho, mode: {mode}."
-    for i in _iteration(n=len(align_models) - 1, progress_name=progress_name, verbose=True):
+    for i in _iteration(n=len(align_models) - 1, progress_name=progress_name, verbose=verbose):
         modelA = align_models[i]
         modelB = align_models[i + 1]
-        if label_key is not None:
-            # calculate label similarity
-            catA = modelA.obs[label_key]
-            catB = modelB.obs[label_key]
-            UnionCategories = np.union1d(catA.cat.categories, catB.cat.categories)
-            catACode, catBCode = np.zeros(catA.shape, dtype=int), np.zeros(catB.shape, dtype=int)
-            for code, cat in enumerate(UnionCategories):
-                if cat == "unknown":
-                    code = -1
-                catACode[catA == cat] = code
-                catBCode[catB == cat] = code
-            LabelSimMat = np.zeros((catA.shape[0], catB.shape[0]))
-            for index in range(catB.shape[0]):
-                LabelSimMat[:, index] = catACode != catBCode[i]
-            LabelSimMat = LabelSimMat.T
+        if label_codes[i] is not None and label_codes[i + 1] is not None:
+            # calculate label similarity from the precomputed codes
+            LabelSimMat = _label_sim_matrix(label_codes[i + 1], label_codes[i])
         else:
             LabelSimMat = None
-        _, P, sigma2 = BA_align(
+        # the optimal rigid transform of sampleB's coordinates is already
+        # computed (and denormalized) inside BA_align, so reuse it directly
+        # instead of re-uploading the vector field through BA_transform
+        _, P, sigma2, modelB.obsm["Rigid_align_spatial"] = BA_align(
             sampleA=modelA,
             sampleB=modelB,
-            genes=genes,
+            genes=common_genes,
             spatial_key="optimal_RnA",
             key_added=key_added,
             iter_key_added=iter_key_added,
@@ -105,15 +164,10 @@ def morpho_align(
             added_similarity=LabelSimMat,
             **kwargs,
         )
-        (_, _, modelB.obsm["Rigid_align_spatial"],) = BA_transform(
-            vecfld=modelB.uns[vecfld_key_added],
-            quary_points=modelB.obsm[spatial_key],
-            device=device,
-            dtype=dtype,
-        )
-        pis.append(P)
+        pis.append(_compress_pi(P, pi_sparse=pi_sparse, pi_mmap_dir=pi_mmap_dir, name=f"pi_{i}"))
         sigma2s.append(sigma2)
-        empty_cache(device=device)
+        if empty_cache_each_iter:
+            empty_cache(device=device)
 
     return align_models, pis, sigma2s
 
@@ -133,7 +187,11 @@ def morpho_align_ref(
     dissimilarity: str = "kl",
     max_iter: int = 100,
     return_full_assignment: bool = True,
-    dtype: str = "float64",
+    nn_assignment: bool = False,
+    pi_sparse: bool = False,
+    pi_mmap_dir: Optional[str] = None,
+    copy: bool = True,
+    dtype: str = "float32",
     device: str = "cpu",
     verbose: bool = True,
     **kwargs,
@@ -155,7 +213,11 @@ def morpho_align_ref(
         mode: The method of alignment. Available ``mode`` are: ``'S'``, ``'N'`` and ``'SN'``.
         dissimilarity: Expression dissimilarity measure: ``'kl'`` or ``'euclidean'``.
         max_iter: Max number of iterations for morpho alignment.
-        dtype: The floating-point number type. Only ``float32`` and ``float64``.
+        nn_assignment: If ``True``, approximate the full assignment by nearest-neighbor interpolation of the reference transport plan instead of recomputing the dense dissimilarity between the full-resolution models. Only used when ``return_full_assignment`` is ``True``.
+        pi_sparse: If ``True``, near-zero entries of each pi matrix are dropped and the matrix is stored as a sparse CSR matrix.
+        pi_mmap_dir: If not None, each pi matrix is saved to ``pi_mmap_dir`` and kept as a read-only memory map instead of residing in memory.
+        copy: Whether to copy ``models`` and ``models_ref`` before alignment. If ``False``, the alignment results (``key_added``, ``'Rigid_align_spatial'``, etc.) are written directly into the caller's AnnData objects, saving one full copy per model.
+        dtype: The floating-point number type. Only ``float32`` and ``float64``. The ``float32`` default halves the memory bandwidth of the pairwise kernels; pass ``float64`` if full double precision is required.
         device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
         verbose: If ``True``, print progress updates.
         **kwargs: Additional parameters that will be passed to ``BA_align`` function.
@@ -168,31 +230,52 @@ def morpho_align_ref(
         sigma2s: List of sigma2.
     """
 
-    # Downsampling
+    # Downsampling. ``downsampling`` copies each model internally, so the
+    # models can be passed directly without an extra copy pass.
     if models_ref is None:
-        models_sampling = [model.copy() for model in models]
         models_ref = downsampling(
-            models=models_sampling,
+            models=models,
             n_sampling=n_sampling,
             sampling_method=sampling_method,
             spatial_key=spatial_key,
         )
 
+    # normalize the genes argument once so downstream set operations do not
+    # re-hash a Python list per pair
+    genes = np.asarray(genes) if genes is not None else None
+
+    # compute the common gene set once instead of re-intersecting inside every
+    # BA_align / BA_transform_and_assignment call, and slice the working copies
+    # to it so no per-call gene indexing is needed
+    all_samples_genes = [m[0].var.index for m in models] + [m[0].var.index for m in models_ref]
+    common_genes = filter_common_genes(*all_samples_genes, verbose=verbose)
+    common_genes = common_genes if genes is None else intersect_lsts(common_genes, genes)
+    common_genes = np.asarray(common_genes)
+
     pis, pis_ref, sigma2s = [], [], []
-    align_models = [model.copy() for model in models]
-    align_models_ref = [model.copy() for model in models_ref]
+    if copy:
+        # the per-model copies are independent and mostly GIL-releasing memcpy,
+        # so run them across a thread pool
+        with ThreadPoolExecutor(max_workers=min(8, len(models) + len(models_ref))) as executor:
+            align_models = list(executor.map(lambda m: m[:, common_genes].copy(), models))
+            align_models_ref = list(executor.map(lambda m: m[:, common_genes].copy(), models_ref))
+    else:
+        # operate directly on the caller's models; BA_align slices to the
+        # common genes internally
+        align_models = list(models)
+        align_models_ref = list(models_ref)
     for model in align_models_ref:
         model.obsm[key_added] = model.obsm[spatial_key]
     align_models[0].obsm[key_added] = align_models[0].obsm[spatial_key]
     progress_name = f"Models alignment with ref-models based on morpho, mode: {mode}."
-    for i in _iteration(n=len(align_models) - 1, progress_name=progress_name, verbose=True):
+    for i in _iteration(n=len(align_models) - 1, progress_name=progress_name, verbose=verbose):
         modelA_ref = align_models_ref[i]
         modelB_ref = align_models_ref[i + 1]
 
-        _, P, sigma2 = BA_align(
+        _, P, sigma2, _ = BA_align(
             sampleA=modelA_ref,
             sampleB=modelB_ref,
-            genes=genes,
+            genes=common_genes,
             spatial_key=key_added,
             key_added=key_added,
             iter_key_added=iter_key_added,
@@ -208,31 +291,54 @@ def morpho_align_ref(
             **kwargs,
         )
         align_models_ref[i + 1] = modelB_ref
-        pis_ref.append(P)
+        pis_ref.append(_compress_pi(P, pi_sparse=pi_sparse, pi_mmap_dir=pi_mmap_dir, name=f"pi_ref_{i}"))
         sigma2s.append(sigma2)
 
         modelA, modelB = align_models[i], align_models[i + 1]
         modelB.uns[vecfld_key_added] = modelB_ref.uns[vecfld_key_added]
         if return_full_assignment:
-            P, modelB.obsm[key_added] = BA_transform_and_assignment(
-                samples=[modelB, modelA],
-                vecfld=modelB_ref.uns[vecfld_key_added],
-                genes=genes,
-                layer=layer,
-                small_variance=True,
-                spatial_key=spatial_key,
-                device=device,
-                dtype=dtype,
-                **kwargs,
-            )
-        else:
-            modelB.obsm[key_added], _, modelB.obsm["Rigid_align_spatial"] = BA_transform(
-                vecfld=modelB_ref.uns[vecfld_key_added],
-                quary_points=modelB.obsm[spatial_key],
-                device=device,
-                dtype=dtype,
-            )
-
-        pis.append(P)
+            if nn_assignment:
+                # each full-resolution spot inherits the transport row/column
+                # of its nearest reference spot, avoiding the dense
+                # dissimilarity recompute between the full models
+                P = interpolate_pi_from_ref(
+                    pi_ref=P,
+                    coords_ref_A=modelA_ref.obsm[spatial_key],
+                    coords_ref_B=modelB_ref.obsm[spatial_key],
+                    coords_A=modelA.obsm[spatial_key],
+                    coords_B=modelB.obsm[spatial_key],
+                )
+                modelB.obsm[key_added], _, modelB.obsm["Rigid_align_spatial"] = BA_transform(
+                    vecfld=modelB_ref.uns[vecfld_key_added],
+                    quary_points=modelB.obsm[spatial_key],
+                    device=device,
+                    dtype=dtype,
+                )
+            else:
+                P, modelB.obsm[key_added] = BA_transform_and_assignment(
+                    samples=[modelB, modelA],
+                    vecfld=modelB_ref.uns[vecfld_key_added],
+                    genes=common_genes,
+                    layer=layer,
+                    small_variance=True,
+                    spatial_key=spatial_key,
+                    device=device,
+                    dtype=dtype,
+                    **kwargs,
+                )
+        pis.append(_compress_pi(P, pi_sparse=pi_sparse, pi_mmap_dir=pi_mmap_dir, name=f"pi_{i}"))
+
+    if not return_full_assignment:
+        # evaluate all vector fields over the full-resolution models in one
+        # device context instead of one BA_transform call per pair
+        XAHats, _, rigid_aligns = BA_transform_batch(
+            vecflds=[m.uns[vecfld_key_added] for m in align_models[1:]],
+            quary_points_list=[m.obsm[spatial_key] for m in align_models[1:]],
+            device=device,
+            dtype=dtype,
+        )
+        for model, XAHat, rigid_align in zip(align_models[1:], XAHats, rigid_aligns):
+            model.obsm[key_added] = XAHat
+            model.obsm["Rigid_align_spatial"] = rigid_align
 
     return align_models, align_models_ref, pis, pis_ref, sigma2s
@@ -53,24 +53,14 @@ def paste_transform(
     return adata
 
 
-def BA_transform(
+def _BA_transform_core(
+    nx,
+    type_as,
     vecfld,
     quary_points,
     deformation_scale: int = 1,
-    dtype: str = "float64",
-    device: str = "cpu",
 ):
-    """Apply non-rigid transform to the quary points
-
-    Args:
-        vecfld: A dictionary containing information about vector fields
-        quary_points:
-        deformation_scale: If deformation_scale is greater than 1, increase the degree of deformation.
-        dtype: The floating-point number type. Only ``float32`` and ``float64``.
-        device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
-    """
-    # Determine if gpu or cpu is being used
-    nx, type_as = check_backend(device=device, dtype=dtype)
+    """Apply one vector field to one batch of query points on an already-initialized backend."""
     normalize_scale = _data(nx, vecfld["normalize_scale"], type_as)
     normalize_mean_ref = _data(nx, vecfld["normalize_mean_list"][0], type_as)
     normalize_mean_quary = _data(nx, vecfld["normalize_mean_list"][1], type_as)
@@ -108,6 +98,65 @@ def BA_transform(
     return XAHat, quary_velocities, quary_optimal_similarity
 
 
+def BA_transform(
+    vecfld,
+    quary_points,
+    deformation_scale: int = 1,
+    dtype: str = "float64",
+    device: str = "cpu",
+):
+    """Apply non-rigid transform to the quary points
+
+    Args:
+        vecfld: A dictionary containing information about vector fields
+        quary_points:
+        deformation_scale: If deformation_scale is greater than 1, increase the degree of deformation.
+        dtype: The floating-point number type. Only ``float32`` and ``float64``.
+        device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
+    """
+    # Determine if gpu or cpu is being used
+    nx, type_as = check_backend(device=device, dtype=dtype)
+    return _BA_transform_core(nx, type_as, vecfld, quary_points, deformation_scale=deformation_scale)
+
+
+def BA_transform_batch(
+    vecflds: List,
+    quary_points_list: List,
+    deformation_scale: int = 1,
+    dtype: str = "float64",
+    device: str = "cpu",
+):
+    """Apply a list of vector fields to the matching batches of query points.
+
+    Initializes the backend / device context once and evaluates all vector
+    fields in a single pass, instead of paying the backend setup and data
+    upload per call.
+
+    Args:
+        vecflds: A list of dictionaries containing information about vector fields.
+        quary_points_list: A list of query point arrays, one per vector field.
+        deformation_scale: If deformation_scale is greater than 1, increase the degree of deformation.
+        dtype: The floating-point number type. Only ``float32`` and ``float64``.
+        device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
+
+    Returns:
+        XAHats: List of non-rigidly transformed query points.
+        quary_velocities: List of velocity fields evaluated at the query points.
+        quary_optimal_similarities: List of optimally rigid-transformed query points.
+    """
+    # Determine if gpu or cpu is being used
+    nx, type_as = check_backend(device=device, dtype=dtype)
+    XAHats, quary_velocities_list, quary_optimal_similarities = [], [], []
+    for vecfld, quary_points in zip(vecflds, quary_points_list):
+        XAHat, quary_velocities, quary_optimal_similarity = _BA_transform_core(
+            nx, type_as, vecfld, quary_points, deformation_scale=deformation_scale
+        )
+        XAHats.append(XAHat)
+        quary_velocities_list.append(quary_velocities)
+        quary_optimal_similarities.append(quary_optimal_similarity)
+    return XAHats, quary_velocities_list, quary_optimal_similarities
+
+
 def BA_transform_and_assignment(
     samples,
     vecfld,
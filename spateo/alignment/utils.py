@@ -1,8 +1,11 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 from anndata import AnnData
+from scipy.sparse import csr_matrix
 from scipy.spatial import cKDTree
 
 from spateo.logging import logger_manager as lm
@@ -17,6 +20,65 @@ def _iteration(n: int, progress_name: str, verbose: bool = True):
     return iteration
 
 
+def _compress_pi(
+    P: np.ndarray,
+    pi_sparse: bool = False,
+    pi_mmap_dir: Optional[str] = None,
+    name: str = "pi_0",
+    tau: float = 1e-6,
+) -> Union[np.ndarray, csr_matrix]:
+    """
+    Optionally store a dense pi matrix in a memory-light format.
+
+    Args:
+        P: The dense pi matrix returned by ``BA_align``.
+        pi_sparse: If ``True``, entries below ``tau * P.max()`` are dropped and the matrix is returned as CSR.
+        pi_mmap_dir: If not None, the matrix is saved to ``pi_mmap_dir`` and returned as a read-only memory map.
+        name: File name (without extension) used when ``pi_mmap_dir`` is set.
+        tau: Relative magnitude threshold used for the sparse conversion.
+
+    Returns:
+        The pi matrix, either unchanged, as a CSR matrix, or as a memory-mapped array.
+    """
+    if pi_mmap_dir is not None:
+        os.makedirs(pi_mmap_dir, exist_ok=True)
+        pi_path = os.path.join(pi_mmap_dir, f"{name}.npy")
+        np.save(pi_path, P)
+        return np.load(pi_path, mmap_mode="r")
+    if pi_sparse:
+        return csr_matrix(np.where(P > tau * P.max(), P, 0))
+    return P
+
+
+def interpolate_pi_from_ref(
+    pi_ref: np.ndarray,
+    coords_ref_A: np.ndarray,
+    coords_ref_B: np.ndarray,
+    coords_A: np.ndarray,
+    coords_B: np.ndarray,
+) -> np.ndarray:
+    """
+    Interpolate a reference transport plan onto full-resolution coordinates.
+
+    Each full-resolution spot inherits the transport row/column of its
+    spatially nearest reference spot, so the full assignment costs two KDTree
+    queries plus a gather instead of a dense dissimilarity recompute.
+
+    Args:
+        pi_ref: The pi matrix of the reference models with shape ``(NA_ref, NB_ref)``.
+        coords_ref_A: Spatial coordinates of reference model A.
+        coords_ref_B: Spatial coordinates of reference model B.
+        coords_A: Spatial coordinates of full-resolution model A.
+        coords_B: Spatial coordinates of full-resolution model B.
+
+    Returns:
+        The interpolated pi matrix with shape ``(NA, NB)``.
+    """
+    _, idx_A = cKDTree(coords_ref_A).query(coords_A, k=1)
+    _, idx_B = cKDTree(coords_ref_B).query(coords_B, k=1)
+    return pi_ref[idx_A, :][:, idx_B]
+
+
 def downsampling(
     models: Union[List[AnnData], AnnData],
     n_sampling: Optional[int] = 2000,
@@ -26,8 +88,8 @@ def downsampling(
     from dynamo.tools.sampling import sample
 
     models = models if isinstance(models, list) else [models]
-    sampling_models = []
-    for m in models:
+
+    def _downsampling_model(m: AnnData) -> AnnData:
         sampling_model = m.copy()
         sampling = sample(
             arr=np.asarray(sampling_model.obs_names),
@@ -35,8 +97,11 @@ def downsampling(
             method=sampling_method,
             X=sampling_model.obsm[spatial_key],
         )
-        sampling_model = sampling_model[sampling, :]
-        sampling_models.append(sampling_model)
+        return sampling_model[sampling, :]
+
+    # each model is downsampled independently, so spread them over threads
+    with ThreadPoolExecutor(max_workers=min(8, len(models))) as executor:
+        sampling_models = list(executor.map(_downsampling_model, models))
     return sampling_models
 
 